@@ -1,4 +1,7 @@
-import itertools
+import collections
+import functools
+import heapq
+import re
 import time
 
 
@@ -17,480 +20,636 @@ import time
 # ====================== 
 
 
-# Evaluates not symbols
+# The expression is turned into Python code that works on whole truth table columns at once,
+# so the boolean operators are the bitwise ones. The code is compiled once and run once.
+# Each expression only writes its own operator, given the code of its sub symbols, so writing the
+# code never needs to recurse
+# Each expression has a key made of its operator and the ids of its sub symbols. The parser makes
+# equal sub expressions the same object, so equal ids means equal sub expressions, and the key
+# stays short however deep the expression is. Python doesn't save the hash of a tuple, so a key
+# holding the whole structure would be hashed again all the way down on every look up
+# And and or don't depend on the order of their terms, so their keys are sorted and B.A reuses A.B
+
+# Joins the codes with the operator, split into bracketed halves when there are a lot of them
+# Python compiles a long chain of one operator recursively, so this keeps the chain short
+def join_codes(operator, codes):
+    if len(codes) <= 64:
+        return operator.join(codes)
+    half = len(codes) // 2
+    return '(' + join_codes(operator, codes[:half]) + ')' + operator + '(' + join_codes(operator, codes[half:]) + ')'
+
+
+# Writes not symbols
 class NotExpression:
     def __init__(self, sub_symbol):
         self.sub_symbol = sub_symbol
+        self.key = ('not', id(sub_symbol))
+
+    def sub_symbols(self):
+        return [self.sub_symbol]
 
-    def evaluate(self, _context):
-        return not self.sub_symbol.evaluate(_context)
+    def to_code(self, sub_codes):
+        return '~' + sub_codes[0]
 
 
-# Evaluates and terms
+# Writes and terms
 class AndExpression:
     def __init__(self, and_list):
         self.and_list = and_list
+        self.key = ('and',) + tuple(sorted(id(term) for term in and_list))
 
-    def evaluate(self, _context):
-        for term in self.and_list:
-            if not term.evaluate(_context):
-                return False
-        return True
+    def sub_symbols(self):
+        return self.and_list
 
+    def to_code(self, sub_codes):
+        return join_codes(' & ', sub_codes)
 
-# Evaluates or expressions
+
+# Writes or expressions
 class OrExpression:
     def __init__(self, expression_list):
         self.expression_list = expression_list
+        self.key = ('or',) + tuple(sorted(id(expr) for expr in expression_list))
 
-    def evaluate(self, _context):
-        for expr in self.expression_list:
-            if expr.evaluate(_context):
-                return True
-        return False
-
+    def sub_symbols(self):
+        return self.expression_list
 
-# Evaluates parentheses in the expression
-class ParenthesizedSymbol:
-    def __init__(self, sub_expr):
-        self.sub_expr = sub_expr
+    def to_code(self, sub_codes):
+        return join_codes(' | ', sub_codes)
 
-    def evaluate(self, _context):
-        return self.sub_expr.evaluate(_context)
 
-
-# Evaluates any variables
+# Writes any variables as the variable's column
+# The variable's position is worked out while parsing, and the column is passed in as the
+# argument at that position, so there is no look up by name
 class VariableSymbol:
-    def __init__(self, letter):
+    def __init__(self, letter, index):
         self.letter = letter
+        self.index = index
+        self.key = ('variable', letter)
+
+    def sub_symbols(self):
+        return []
 
-    def evaluate(self, _context):
-        return _context[self.letter]
+    def to_code(self, sub_codes):
+        return 'v' + str(self.index)
 
 
-# Evaluates any literals
+# Writes any literals
 class LiteralSymbol:
     def __init__(self, literal):
         self.literal = literal
+        self.key = ('literal', literal)
+
+    def sub_symbols(self):
+        return []
+
+    def to_code(self, sub_codes):
+        # -1 has every bit set, so a true literal is true in every row
+        return '(-1)' if self.literal else '0'
+
+
+# Every way of writing each operator, shared by every parser
+# Frozensets so checking a token is a single hash lookup
+NOT_ALTERNATIVES = frozenset({'!', 'not', '¬', '-'})
+OR_ALTERNATIVES = frozenset({'+', 'or', '|', 'v'})
+AND_ALTERNATIVES = frozenset({'.', 'and', '^', '&'})
+
+
+# Turns a set of operator alternatives into a regex that matches any one of them
+# Word operators must not be followed by a letter, so e.g. 'order' is still a variable
+def alternatives_regex(alternatives):
+    ret = []
+    # Longest first so the regex doesn't stop at a shorter alternative
+    for alternative in sorted(alternatives, key=len, reverse=True):
+        if alternative.isalpha():
+            ret.append(re.escape(alternative) + r'(?![^\W\d_])')
+        else:
+            ret.append(re.escape(alternative))
+    return '|'.join(ret)
+
 
-    def evaluate(self, _context):
-        return self.literal
+# Every kind of token is a named group of one regex, so the regex engine works out
+# the kind of each token while splitting the text, and whitespace is skipped over
+TOKEN_REGEX = re.compile(
+    '(?P<not>' + alternatives_regex(NOT_ALTERNATIVES) + ')'
+    '|(?P<or>' + alternatives_regex(OR_ALTERNATIVES) + ')'
+    '|(?P<and>' + alternatives_regex(AND_ALTERNATIVES) + ')'
+    r'|(?P<open>\()'
+    r'|(?P<close>\))'
+    r'|(?P<literal>[01])'
+    r'|(?P<variable>[^\W\d_]+)'
+    r'|(?P<other>\S)'
+)
+
+# How tightly each binary operator binds, and binds tighter than or
+PRECEDENCE = {'or': 1, 'and': 2}
 
 
 # Parses each section of the expression into a usable state
 class Parser:
     def __init__(self, text):
         self.text = text
-        self.pos = 0
-        self.variableSet = set()  # Tracks all the variables in the expression
-        self.variables = []
-        self.NOT_ALTERNATIVES = [
-            '!', 'not', '¬', '-'
-        ]
-        self.OR_ALTERNATIVES = [
-            '+', 'or', '|', 'v'
-        ]
-        self.AND_ALTERNATIVES = [
-            '.', 'and', '^', '&'
-        ]
-
-    def order_variable_set(self):
-        return sorted(self.variableSet)
-
-    # Reads the tokens of the expression by iterating through the position
-    def consume_token(self):
-        # Skips over whitespace
-        while self.pos < len(self.text) and self.text[self.pos] == ' ':
-            self.pos += 1
-        # If end of string
-        if self.pos >= len(self.text):
-            return None  # None = special token
-        # If the text at current position is a letter
-        elif self.text[self.pos].isalpha():
-            ret = ''
-            # Loop through all letters in text
-            while self.pos < len(self.text) and self.text[self.pos].isalpha():
-                ret += self.text[self.pos]
-                self.pos += 1
-            return ret
-        else:
-            ret = self.text[self.pos]
-            self.pos += 1
-            return ret
-
-    # Reads the token of the expression at current position
-    def peek_token(self):
-        prev_pos = self.pos
-        ret = self.consume_token()
-        self.pos = prev_pos
-        return ret
+        self.tokens = self.tokenize()
+        self.variables = {}  # Tracks all the variables in the expression and their position, in order
+        self.nodes = {}  # Every node built so far by its key, so equal sub expressions share one node
+
+    # Splits the expression into (kind, token) pairs in one pass
+    def tokenize(self):
+        return [(match.lastgroup, match.group()) for match in TOKEN_REGEX.finditer(self.text)]
 
     # Parsed expression
+    # Uses the shunting yard algorithm in one loop over the tokens: symbols go on the operand stack,
+    # and operators wait on the operator stack until something that binds less tightly comes along
+    # Each operator on the stack is [kind, count], where repeats of the same and/or add to the count
+    # instead, so A.B.C is built into one and term of three symbols
     def parse(self):
-        ret = self.parse_or()
-        if self.consume_token() is not None:
-            raise Exception('Error: Parse error')
-        self.variables = self.order_variable_set()
-        return ret
+        operands = []
+        operators = []
+        expect_symbol = True  # Whether the next token should start a symbol or be an operator
+        for kind, token in self.tokens:
+            if expect_symbol:
+                if kind == 'not' or kind == 'open':
+                    operators.append([kind, 1])
+                    continue
+                elif kind == 'literal':
+                    operands.append(LiteralSymbol(token == '1'))
+                # 'v' is lexed as or, but where a symbol should start it can only be the variable v
+                elif kind == 'variable' or (kind == 'or' and token == 'v'):
+                    operands.append(self.parse_variable_symbol(token))
+                else:
+                    raise Exception('Error: variable not detected')
+                self.apply_nots(operands, operators)
+                expect_symbol = False
+            elif kind == 'and' or kind == 'or':
+                # Build anything waiting that binds more tightly first
+                while operators and operators[-1][0] in PRECEDENCE \
+                        and PRECEDENCE[operators[-1][0]] > PRECEDENCE[kind]:
+                    self.apply_operator(operands, operators.pop())
+                if operators and operators[-1][0] == kind:
+                    operators[-1][1] += 1
+                else:
+                    operators.append([kind, 1])
+                expect_symbol = True
+            elif kind == 'close':
+                while operators and operators[-1][0] != 'open':
+                    self.apply_operator(operands, operators.pop())
+                if not operators:
+                    raise Exception('Error: Missing (')
+                operators.pop()
+                # The parentheses only change the order things are built in, so they aren't kept in the AST
+                self.apply_nots(operands, operators)
+            else:
+                raise Exception('Error: Parse error')
+        if expect_symbol:
+            raise Exception('Error: variable not detected')
+        while operators:
+            if operators[-1][0] == 'open':
+                raise Exception('Error: Missing )')
+            self.apply_operator(operands, operators.pop())
+        return operands[0]
+
+    # Builds an and/or taken off the operator stack from the operands it joins
+    def apply_operator(self, operands, operator):
+        kind, count = operator
+        terms = operands[-(count + 1):]
+        del operands[-(count + 1):]
+        if kind == 'or':
+            operands.append(self.build_or(terms))
+        else:
+            operands.append(self.build_and(terms))
+
+    # Applies any nots waiting for the symbol just finished
+    def apply_nots(self, operands, operators):
+        while operators and operators[-1][0] == 'not':
+            operators.pop()
+            operands.append(self.build_not(operands.pop()))
 
     # Returns the or of expression
-    def parse_or(self):
-        terms = [self.parse_and()]
-        token = self.peek_token()
-        while token in self.OR_ALTERNATIVES:
-            token = self.consume_token()
-            terms.append(self.parse_and())
-            token = self.peek_token()
-        ret = OrExpression(terms)
+    def build_or(self, terms):
+        # An or inside an or, e.g. from (A+B)+C, is the same as one or of all the terms
+        flat_terms = []
+        for term in terms:
+            if isinstance(term, OrExpression):
+                flat_terms += term.expression_list
+            else:
+                flat_terms.append(term)
+        # Fold any literals, a 1 makes the whole expression 1 and a 0 can be dropped
+        if any(term.key == ('literal', True) for term in flat_terms):
+            return LiteralSymbol(True)
+        # Each term only needs to be in the or once, keyed so repeats are found with one look up
+        unique_terms = {}
+        for term in flat_terms:
+            if term.key != ('literal', False):
+                unique_terms.setdefault(term.key, term)
+        # A term or'd with its not is always 1
+        if any(('not', id(term)) in unique_terms for term in unique_terms.values()):
+            return LiteralSymbol(True)
+        terms = list(unique_terms.values())
+        if not terms:
+            return LiteralSymbol(False)
+        # An or of one term is just that term
+        if len(terms) == 1:
+            return terms[0]
+        ret = self.intern_node(OrExpression(terms))
         return ret
 
     # Returns the and term of expression
-    def parse_and(self):
-        terms = [self.parse_symbol()]
-        token = self.peek_token()
-        while token in self.AND_ALTERNATIVES:
-            token = self.consume_token()
-            terms.append(self.parse_symbol())
-            token = self.peek_token()
-        ret = AndExpression(terms)
+    def build_and(self, terms):
+        # An and inside an and, e.g. from (A.B).C, is the same as one and of all the symbols
+        flat_terms = []
+        for term in terms:
+            if isinstance(term, AndExpression):
+                flat_terms += term.and_list
+            else:
+                flat_terms.append(term)
+        # Fold any literals, a 0 makes the whole term 0 and a 1 can be dropped
+        if any(term.key == ('literal', False) for term in flat_terms):
+            return LiteralSymbol(False)
+        # Each symbol only needs to be in the term once, keyed so repeats are found with one look up
+        unique_terms = {}
+        for term in flat_terms:
+            if term.key != ('literal', True):
+                unique_terms.setdefault(term.key, term)
+        # A symbol and'd with its not is always 0
+        if any(('not', id(term)) in unique_terms for term in unique_terms.values()):
+            return LiteralSymbol(False)
+        terms = list(unique_terms.values())
+        if not terms:
+            return LiteralSymbol(True)
+        # An and of one symbol is just that symbol
+        if len(terms) == 1:
+            return terms[0]
+        ret = self.intern_node(AndExpression(terms))
         return ret
 
-    # If next pos is open bracket then parse parenthesis
-    # If next pos is not then parse not
-    # If next pos is literal then set true or false
-    # If next pos is variable then parse variable symbol
-    def parse_symbol(self):
-        token = self.peek_token()
-        if token == "(":
-            return self.parse_parenthesized_symbol()
-        elif token in self.NOT_ALTERNATIVES:
-            return self.parse_not()
-        elif token == "1" or token == "0":
-            return self.parse_literal()
-        else:
-            return self.parse_variable_symbol()
-
-    # Returns the not of the expression
-    def parse_not(self):
-        token = self.consume_token()
-        if token not in self.NOT_ALTERNATIVES:
-            raise Exception('Error: Invalid syntax')
-        sub_symbol = self.parse_symbol()
-        ret = NotExpression(sub_symbol)
+    # Returns the not of the symbol
+    def build_not(self, sub_symbol):
+        # Fold the not of a literal, and cancel out a double not
+        if sub_symbol.key[0] == 'literal':
+            return LiteralSymbol(not sub_symbol.key[1])
+        if isinstance(sub_symbol, NotExpression):
+            return sub_symbol.sub_symbol
+        ret = self.intern_node(NotExpression(sub_symbol))
         return ret
 
-    # Returns the expression within the parentheses
-    # Errors if either parentheses missing
-    def parse_parenthesized_symbol(self):
-        token = self.consume_token()
-        if not token == "(":
-            raise Exception('Error: Missing (')
-        ret = ParenthesizedSymbol(self.parse_or())
-        token = self.consume_token()
-        if not token == ")":
-            raise Exception('Error: Missing )')
-        return ret
+    # Returns the node already built with the same key if there is one, otherwise keeps this one
+    def intern_node(self, node):
+        return self.nodes.setdefault(node.key, node)
 
-    # Returns any variables in the expression/term
-    # Raises an error if the variable is not text
-    def parse_variable_symbol(self):
-        name = self.consume_token()
-        if name is None:
-            raise Exception('Error: variable not detected')
-        if not name.isalpha():
-            raise Exception('Error: variable not detected')
-        self.variableSet.add(name)
-        return VariableSymbol(name)
-
-    # Returns if literal is true or false
-    def parse_literal(self):
-        token = self.consume_token()
-        if not token == "1" and not token == "0":
-            raise Exception('Error: Incorrect syntax')
-        if token == "1":
-            literal = True
-        else:
-            literal = False
-        ret = LiteralSymbol(literal)
-        return ret
+    # Returns the variable symbol for a variable name
+    def parse_variable_symbol(self, name):
+        # A new variable goes after all the variables seen so far
+        self.variables.setdefault(name, len(self.variables))
+        return self.intern_node(VariableSymbol(name, self.variables[name]))
 
 
-# Generates all the combinations of the truth table based on the variables given
+# Parses an expression into its AST and its variables in order
+# Cached on the text so entering the same expression again doesn't parse it again
+# The AST is never changed after parsing, so it is safe to hand out the same one
+@functools.lru_cache(maxsize=128)
+def compile_expr(text):
+    parser = Parser(text)
+    ast = parser.parse()
+    return ast, tuple(parser.variables)
+
+
+# Generates the columns of the truth table based on the variables given
+# Each column is an int where bit r is the value of the variable in row r
+# E.g. with vars a, b the column of a is 0b1100 and the column of b is 0b1010
 class GenerateContext:
     def __init__(self, variables):
         self.variables = variables
         num_vars = len(self.variables)
-        # Generate the list of combinations (each row is a tuple)
-        self.combinations = list(itertools.product([0, 1], repeat=num_vars))
-
-    def evaluate_ast_row(self):
-        _context = []
-        # Loop through tuples of combinations
-        for tuples in self.combinations:
-            # Loop through elements of tuples
-            context_row = (dict(zip(self.variables, tuples)))
-            # Add the dictionary (row) to the list of dicts (rows)
-            _context.append(context_row)
-        return _context
-
-    def generate_truths(self):
-        _context = self.evaluate_ast_row()
-        output_row = []
-        for row in _context:
-            # Run the parser on current dictionary of variables
-            output_row.append(ast.evaluate(row))
-        return output_row
-
-
-# Runs the Quine-McClusky algorithm and further simplifies using Petrick's method
+        self.num_rows = pow(2, num_vars)
+        # Every row set, used to drop the sign bits left over by not
+        self.full_mask = (1 << self.num_rows) - 1
+        # The first variable is the most significant bit of the row number
+        self.columns = tuple(self.generate_column(num_vars - 1 - i) for i in range(num_vars))
+
+    # Builds the column of the variable that is bit 'shift' of the row number
+    # The column is blocks of 2^shift zeros then 2^shift ones repeated, so start from one
+    # block of each and keep doubling it with a copy of itself until it fills every row
+    # E.g. shift 0 with 4 rows: 0b10, then 0b10 | 0b1000 = 0b1010
+    def generate_column(self, shift):
+        block = 1 << shift
+        column = ((1 << block) - 1) << block
+        length = 2 * block
+        while length < self.num_rows:
+            column |= column << length
+            length *= 2
+        return column
+
+    # Writes the expression as a function taking the columns in order, with one statement for each
+    # different sub expression, so a repeated sub expression such as A.B is only evaluated once
+    # Walks the AST with a stack instead of recursing, writing every sub symbol before the expression
+    # using it, so the code is flat however deeply the expression is nested
+    def generate_code(self, _ast):
+        # Key is the sub expression, content is the code or saved name for its column
+        # The parser makes equal sub expressions the same object, so the node itself is the key
+        names = {}
+        lines = ['def function(' + ', '.join('v' + str(i) for i in range(len(self.columns))) + '):']
+        stack = [(_ast, False)]
+        while stack:
+            symbol, sub_symbols_written = stack.pop()
+            if symbol in names:
+                continue
+            if sub_symbols_written or not symbol.sub_symbols():
+                code = symbol.to_code([names[sub_symbol] for sub_symbol in symbol.sub_symbols()])
+                # Variables and literals are written in place, everything else is saved to a name
+                if symbol.sub_symbols():
+                    names[symbol] = '_' + str(len(lines))
+                    lines.append('    ' + names[symbol] + ' = ' + code)
+                else:
+                    names[symbol] = code
+            else:
+                stack.append((symbol, True))
+                for sub_symbol in reversed(symbol.sub_symbols()):
+                    stack.append((sub_symbol, False))
+        lines.append('    return ' + names[_ast])
+        return '\n'.join(lines) + '\n'
+
+    # Returns the output column, bit r is the output of row r
+    def generate_truths(self, _ast):
+        # Compile the expression's code once, then run it on every row at once
+        namespace = {}
+        exec(self.generate_code(_ast), namespace)
+        return namespace['function'](*self.columns) & self.full_mask
+
+
+# A term of the Quine-McClusky algorithm, the set bits of mask are the '-' bits
+# E.g. -10- is Implicant(value=0b0100, mask=0b1001)
+Implicant = collections.namedtuple('Implicant', 'value mask')
+
+
+# Generates groups for all terms and merges them until only the prime implicants are left
+# Terms are (value, mask) pairs of ints, but only the prime implicants are made into Implicants
+# Cached so simplifying the same function again doesn't redo the merging
+@functools.lru_cache(maxsize=1024)
+def find_prime_implicants(num_vars, minterms):
+    all_bits = (1 << num_vars) - 1
+    prime_implicants = set()
+    # Groups dict: Key is (mask, number of 1s in value), content is the set of values with that key
+    # A group is made empty the first time it is used, so adding a term never has to check for it
+    groups = collections.defaultdict(set)
+
+    # FIRST SET OF GROUPS
+    # The group is decided by the '-' bits and the number of 1s in the row (want to start from 0)
+    for term in minterms:
+        groups[(0, term.bit_count())].add(term)
+
+    # SECOND SET OF GROUP SETS
+    # Any term which is only one bit different to a term in the group with one more 1, and
+    # has its '-' bits in the same place, is merged with it into the corresponding group
+    # E.g. min terms 2,6 are 1 off and in adjacent groups, put them in one group together
+    # And finds prime implicants
+    while True:
+        first_set_groups = groups
+        # Changed dict: Key is the group, content is the values in it that have been merged
+        # Kept per group so no (value, mask) pairs have to be made while merging
+        changed_minterms = {}
+        groups = collections.defaultdict(set)
+        for (mask, num_ones), group in first_set_groups.items():
+            # Only terms with the same '-' bits and one more 1 can differ by a single bit
+            next_group = first_set_groups.get((mask, num_ones + 1))
+            if not next_group:
+                continue
+            changed = changed_minterms.setdefault((mask, num_ones), set())
+            next_changed = changed_minterms.setdefault((mask, num_ones + 1), set())
+            for value in group:
+                # Set each 0 bit that isn't a '-' in turn and look the result up in the next group
+                # instead of comparing against every term in it
+                free_bits = all_bits & ~mask & ~value
+                while free_bits:
+                    bit = free_bits & -free_bits
+                    free_bits ^= bit
+                    if value | bit in next_group:
+                        changed.add(value)
+                        next_changed.add(value | bit)
+                        # A term with several '-' bits can be made by merging on any of them,
+                        # so only merge on a bit above all the current '-' bits to make it once
+                        if bit < mask:
+                            continue
+                        # The bit that differs becomes a '-', value has it as 0 so value is kept
+                        groups[(mask | bit, num_ones)].add(value)
+
+        # Add any minterms that can't go further, to prime implicants set
+        for (mask, num_ones), group in first_set_groups.items():
+            unchanged_minterms = group.difference(changed_minterms.get((mask, num_ones), ()))
+            prime_implicants.update(Implicant(value, mask) for value in unchanged_minterms)
+
+        # If the minterms can't be combined further
+        if not groups:
+            return frozenset(prime_implicants)
+
+
+# Runs the Quine-McClusky algorithm and further simplifies by finding the smallest cover of the prime implicants
 class QM:
-    def __init__(self, _context, _outputRow, variables):
-        self.context = _context
-        self.output_row = _outputRow
+    # How much work the cover search does before settling for the best cover so far, counted as the
+    # rows and prime implicants looked at. The search is exponential, so this keeps large functions
+    # from hanging the program
+    MAX_SEARCH_WORK = 1000000
+    # Above this many prime implicants even setting up the search takes too long, so the greedy
+    # cover is used as it is
+    MAX_EXACT_IMPLICANTS = 500
+
+    def __init__(self, _outputColumn, variables):
+        self.output_column = _outputColumn
         self.variables = variables
         self.minterms = []
         self.prime_implicants = set()
         self.function = []
+        self.search_work = 0
 
-    # Generates binary minterms from context
+    # Generates minterms from the rows of the output column that are 1
+    # Row r of the truth table is the row where the variables spell r in binary
     def generate_min_terms(self):
-        for row in self.context:
-            # Turn the corresponding context row into decimal
-            minterm = ''
-            for element in row:
-                minterm += str(row.get(element))
-            self.minterms.append(int(minterm, 2))
-
-    # Removes all minterms that have output of 0
-    def remove_dont_cares(self):
-        # Loop through table rows
-        pos_flags = []
-        temp = []
-        i = 0
-        for pos, row in enumerate(self.output_row):
-            if not row:
-                temp.append(self.output_row[row])
-            else:
-                pos_flags.append(pos)
-        self.output_row = temp.copy()
-
-        for pos in pos_flags:
-            self.minterms.pop(pos - i)
-            i += 1
-
-    # Flattens a list
-    def list_flatten(self, input_list):
-        flattened_elements = []
-        for i in input_list:
-            flattened_elements.extend(input_list[i])
-        return flattened_elements
+        # Write the column out in binary once, reversed so row 0 comes first
+        rows = format(self.output_column, 'b')[::-1]
+        self.minterms = [row for row, output in enumerate(rows) if output == '1']
 
     # Finds out which minterms have been merged
     # E.g. -100 is gotten by merging 1100 and 0100
-    def find_merged_minterms(self, minterm):
-        differed_bit = minterm.count('-')
-        # If minterms not been merged
-        if differed_bit == 0:
-            return [str(int(minterm, 2))]
-        diff = [bin(i)[2:].zfill(differed_bit) for i in range(pow(2, differed_bit))]
-        temp_list = []
-        # Iterate through number of bits changed to '-'
-        for x in range(pow(2, differed_bit)):
-            temp_min_terms = minterm[:]
-            prev_term = -1
-            # Iterate through bin number with differed bits in empty slots
-            for y in diff[0]:
-                if prev_term != -1:
-                    prev_term = prev_term + temp_min_terms[prev_term + 1:].find('-') + 1
-                else:
-                    prev_term = temp_min_terms[prev_term + 1:].find('-')
-                temp_min_terms = temp_min_terms[:prev_term] + y + temp_min_terms[prev_term + 1:]
-            temp_list.append(str(int(temp_min_terms, 2)))
-            diff.pop(0)
-        return temp_list
-
-    # Creates the prime implicants list from the minterms which have been merged
-    def generate_prime_implicants(self):
-        prime_implicants_list = {}
-        for i in self.prime_implicants:
-            # List of minterms that have been merged
-            merged_minterms = self.find_merged_minterms(i)
-            for j in merged_minterms:
-                try:
-                    # Add prime implicants to list
-                    if i not in prime_implicants_list[j]:
-                        prime_implicants_list[j].append(i)
-                    else:
-                        pass
-                except KeyError:
-                    prime_implicants_list[j] = [i]
-        return prime_implicants_list
-
-    # Finds all essential prime implicants in the prime implicants list
-    def generate_essential_prime_implicants(self, prime_implicants):
-        ret = []
-        for i in prime_implicants:
-            if len(prime_implicants[i]) == 1:
-                if prime_implicants[i][0] not in ret:
-                    ret.append(prime_implicants[i][0])
-                else:
-                    None
-        return ret
+    # Each minterm is the value with some of the '-' bits set, so counting down through every
+    # submask of the mask with (sub - 1) & mask gives each one exactly once
+    def enumerate_covered(self, value, mask):
+        merged_minterms = []
+        sub = mask
+        while True:
+            merged_minterms.append(value | sub)
+            if sub == 0:
+                return merged_minterms
+            sub = (sub - 1) & mask
+
+    # Finds all essential prime implicants, the ones that are alone in covering some row
+    # One pass over the cover masks tracks which rows are covered at all and which more than once
+    def generate_essential_prime_implicants(self, covers):
+        covered_once = 0
+        covered_twice = 0
+        for i in covers:
+            covered_twice |= covered_once & covers[i]
+            covered_once |= covers[i]
+        return [i for i in covers if covers[i] & ~covered_twice]
 
     # Finds variables from minterm
     # E.g. minterm -10- (assuming vars a, b, c, d) would be BC'
-    def generate_variables_from_minterm(self, minterm):
+    def generate_variables_from_minterm(self, implicant):
+        value, mask = implicant
         ret = []
-        for i in range(len(minterm)):
-            current_var = self.variables[i]
-            if minterm[i] == '0':
-                ret.append(current_var + "'")
-            elif minterm[i] == '1':
+        for i, current_var in enumerate(self.variables):
+            # The first variable is the most significant bit
+            bit = 1 << (len(self.variables) - 1 - i)
+            if mask & bit:
+                continue
+            elif value & bit:
                 ret.append(current_var)
-        return ret
-
-    # Returns true or false on comparison and position of differ (if true)
-    def does_bit_differ_by_one(self, first_bin_num, second_bin_num):
-        diff_pos = 0
-        count_diffs = 0
-        for i in range(len(first_bin_num)):
-            if first_bin_num[i] != second_bin_num[i]:
-                diff_pos = i
-                count_diffs += 1
-                if count_diffs > 1:
-                    return False, None
-        if count_diffs == 0:
-            return False, None
-        return True, diff_pos
-
-    # Multiplies 2 minterms
-    def multiply_minterms(self, exp1, exp2):
-        ret = []
-        for x in exp1:
-            # Checks with the ' in the place
-            if x + "'" in exp2 or (len(x) == 2 and x[0] in exp2):
-                return []
             else:
-                ret.append(x)
-        for x in exp2:
-            if x not in ret:
-                ret.append(x)
+                ret.append(current_var + "'")
         return ret
 
-    # Multiplies 2 expressions
-    def multiply_expressions(self, exp1, exp2):
-        ret = []
-        for x in exp1:
-            for y in exp2:
-                multi_exp = self.multiply_minterms(x, y)
-                ret.append(multi_exp) if len(multi_exp) != 0 else None
-        return ret
+    # Finds the rows each prime implicant covers, as a mask where bit r is row r
+    def generate_cover_masks(self):
+        covers = {}
+        for i in self.prime_implicants:
+            covers[i] = 0
+            for minterm in self.enumerate_covered(i.value, i.mask):
+                covers[i] |= 1 << minterm
+        return covers
+
+    # Returns the number of prime implicants and then the number of variables in a cover
+    # Smaller is better, so covers can be compared with <
+    def cover_cost(self, cover):
+        return len(cover), sum(len(self.variables) - i.mask.bit_count() for i in cover)
+
+    # Keeps picking the prime implicant that covers the most rows still needed
+    # Gives the search below a good cover to beat from the start
+    # The prime implicants wait in a heap by how many rows they covered when last counted. That can
+    # only go down as rows get covered, so only the top one needs counting again before it is picked
+    def find_greedy_cover(self, covers, need):
+        heap = [(-covers[i].bit_count(), i) for i in covers]
+        heapq.heapify(heap)
+        cover = []
+        rows_left = need
+        while rows_left:
+            old_count, i = heapq.heappop(heap)
+            count = (covers[i] & rows_left).bit_count()
+            # Prime implicants that cover none of the rows left are dropped for good
+            if count == 0:
+                continue
+            if count < -old_count:
+                heapq.heappush(heap, (-count, i))
+                continue
+            cover.append(i)
+            rows_left &= ~covers[i]
+        # A prime implicant picked early can end up with all its rows covered by ones picked later,
+        # so drop any that the rest of the cover doesn't need, the most variables first
+        # Counts how many picked prime implicants cover each row, so checking one is just its rows
+        rows_in = {i: [row for row in self.enumerate_covered(i.value, i.mask) if (need >> row) & 1] for i in cover}
+        num_covering = collections.Counter(row for i in cover for row in rows_in[i])
+        redundant = set()
+        for i in sorted(cover, key=lambda i: self.cover_cost([i])[1], reverse=True):
+            if all(num_covering[row] > 1 for row in rows_in[i]):
+                redundant.add(i)
+                num_covering.subtract(rows_in[i])
+        return [i for i in cover if i not in redundant]
+
+    # Drops any prime implicant that covers no more of the needed rows than one already kept,
+    # which covers at least as many with no more variables, so it can never give a cheaper cover
+    def remove_dominated(self, candidates):
+        num_variables_in = {i: self.cover_cost([i])[1] for i in candidates}
+        kept = []
+        for i in sorted(candidates, key=lambda i: (-candidates[i].bit_count(), num_variables_in[i])):
+            for k in kept:
+                if candidates[i] | candidates[k] == candidates[k] and num_variables_in[k] <= num_variables_in[i]:
+                    break
+            else:
+                kept.append(i)
+        return kept
+
+    # Branch and bound search for the cover of the rows in need with the lowest cost
+    # Covering is the prime implicants that cover each row, worked out once before the search
+    # Branches on the needed minterm that the fewest prime implicants cover, and gives up on a
+    # branch once it can't beat the best cover found so far
+    def find_minimum_cover(self, covers, covering, need, cover, best_cover):
+        if not need:
+            return min(cover, best_cover, key=self.cover_cost)
+        if self.search_work > self.MAX_SEARCH_WORK:
+            return best_cover
+        # The prime implicants covering each needed minterm, fewest first
+        rows = format(need, 'b')[::-1]
+        needed = sorted((covering[j] for j, row in enumerate(rows) if row == '1'), key=len)
+        self.search_work += len(rows) + sum(len(i) for i in needed)
+        # Minterms that share no prime implicants each need a different one, so collecting
+        # such minterms gives a lower bound on the prime implicants and variables still to add
+        lower_bound = 0
+        extra_variables = 0
+        used = set()
+        for implicants in needed:
+            if used.isdisjoint(implicants):
+                used.update(implicants)
+                lower_bound += 1
+                extra_variables += min(self.cover_cost([i])[1] for i in implicants)
+        num_implicants, num_variables = self.cover_cost(cover)
+        if (num_implicants + lower_bound, num_variables + extra_variables) >= self.cover_cost(best_cover):
+            return best_cover
+        # Every cover has to include one of the prime implicants covering this minterm
+        for i in needed[0]:
+            best_cover = self.find_minimum_cover(covers, covering, need & ~covers[i], cover + [i], best_cover)
+        return best_cover
 
     # Generates groups for all terms
     def group_terms(self):
         self.generate_min_terms()
-        self.remove_dont_cares()
-        self.minterms.sort()
-        bin_length = len(bin(self.minterms[-1])) - 2
-        groups = {}
-
-        # FIRST SET OF GROUPS
-        # The group number is decided by the number of 1s in the row (want to start from 0)
-        # Groups dict: Key is number of 1s in minterm, content is all the minterms with that number of 1s
-        for term in self.minterms:
-            num_ones_in_minterm = (bin(term).count('1'))
-            try:
-                # If group exists,
-                # Append current minterm to correct group dict list (according to key)
-                groups[num_ones_in_minterm].append((bin(term)[2:].zfill(bin_length)))
-            except KeyError:
-                # If group does not already exist,
-                # Set current minterm to new group dict list (according to key)
-                groups[num_ones_in_minterm] = [(bin(term)[2:].zfill(bin_length))]
-
-        # SECOND SET OF GROUP SETS
-        # Any adjacent set which has a context row that is only one value different, add that to corresponding group
-        # E.g. min terms 2,6 are 1 off and in adjacent groups, put them in one group together
-        # And finds prime implicants
-        while True:
-            first_set_groups = groups.copy()
-            break_loop = True
-            changed_minterms = set()
-            group_num = 0
-            groups = {}
-            group_elements = sorted(list(first_set_groups.keys()))
-            for x in range(len(group_elements) - 1):
-                # Iterates current group elements
-                for y in first_set_groups[group_elements[x]]:
-                    # Iterates next group elements
-                    for z in first_set_groups[group_elements[x + 1]]:
-                        bit_differ = self.does_bit_differ_by_one(y, z)
-                        # If minterms differ by one bit
-                        if bit_differ[0]:
-                            try:
-                                # If group set already exists
-                                if y[:bit_differ[1]] + '-' + y[bit_differ[1] + 1:] not in groups[group_num]:
-                                    # Replace the different bit in diff pos with a '-'
-                                    groups[group_num].append(y[:bit_differ[1]] + '-' + y[bit_differ[1] + 1:])
-                                else:
-                                    pass
-                            except KeyError:
-                                # If group set does not exist, create the group set
-                                groups[group_num] = [y[:bit_differ[1]] + '-' + y[bit_differ[1] + 1:]]
-                            break_loop = False
-                            changed_minterms.add(y)
-                            changed_minterms.add(z)
-                group_num += 1
-
-            # Stores all the unchanged minterms
-            unchanged_minterms = set(self.list_flatten(first_set_groups)).difference(changed_minterms)
-            # Add any minterms that can't go further, to prime implicants set
-            self.prime_implicants = self.prime_implicants.union(unchanged_minterms)
-
-            # If the minterms can't be combined further
-            if break_loop:
-                break
-
-    # Petrick's method determines all the minimum SOP (sum of product) solutions from the prime implicants list
-    def petricks_method(self, _prime_implicants_list, _essential_prime_implicants):
-        petrick = [[self.generate_variables_from_minterm(x) for x in _prime_implicants_list[y]] for y in _prime_implicants_list]
-        # Multiplies terms until sum of products of term is reached
-        while len(petrick) > 1:
-            petrick[1] = self.multiply_expressions(petrick[0], petrick[1])
-            petrick.pop(0)
-        # Chooses the term with the least variables
-        self.function = [min(petrick[0], key=len)]
-        # Adds the essential prime implicants to final function
-        self.function.extend(self.generate_variables_from_minterm(i) for i in _essential_prime_implicants)
+        # If the expression is never true there is nothing to group
+        if not self.minterms:
+            return
+        self.prime_implicants = find_prime_implicants(len(self.variables), frozenset(self.minterms))
 
     def generate_solution(self):
         self.group_terms()
-        prime_implicants_list = self.generate_prime_implicants()
-        # Finds the essential prime implicants from prime implicants list
-        essential_prime_implicants = self.generate_essential_prime_implicants(prime_implicants_list)
-        # Removes all the essential prime implicants from primeimplicants list
+        covers = self.generate_cover_masks()
+        essential_prime_implicants = self.generate_essential_prime_implicants(covers)
+        # Removes the rows the essential prime implicants cover from the rows still needed
+        need = self.output_column
         for x in essential_prime_implicants:
-            for y in self.find_merged_minterms(x):
-                try:
-                    del prime_implicants_list[y]
-                except KeyError:
-                    pass
-
-        # If no minterms are left after removing all the essential prime implicants
-        if len(prime_implicants_list) == 0:
-            # Set the function
-            self.function = [self.generate_variables_from_minterm(i) for i in essential_prime_implicants]
-        # If there are left, use Petrick's method to simplify further
-        else:
-            self.petricks_method(prime_implicants_list, essential_prime_implicants)
+            need &= ~covers[x]
+
+        # If there are rows left, find the smallest set of prime implicants that covers them
+        cover = []
+        if need:
+            # Only the prime implicants covering a row still needed can be part of the cover
+            candidates = {i: covers[i] & need for i in covers if covers[i] & need}
+            cover = self.find_greedy_cover(candidates, need)
+            if len(candidates) <= self.MAX_EXACT_IMPLICANTS:
+                # The prime implicants left after removing the dominated ones, by each row they cover
+                covering = {}
+                for i in self.remove_dominated(candidates):
+                    for j, row in enumerate(format(candidates[i], 'b')[::-1]):
+                        if row == '1':
+                            covering.setdefault(j, []).append(i)
+                cover = self.find_minimum_cover(covers, covering, need, [], cover)
+        self.function = [self.generate_variables_from_minterm(i) for i in essential_prime_implicants + cover]
 
         # If there is no function
-        if not any(self.function):
+        if not self.function:
             print('There is no solution to this expression.')
+        # If a term has no variables left the expression is always true
+        elif not all(self.function):
+            print('Solution: F = 1')
         else:
             print('Solution: F = ' + ' + '.join(''.join(i) for i in self.function))
 
 
+# Evaluates the expression for every row and simplifies it in one go
+# The truth table only ever exists as one column per variable and one output column,
+# which is handed straight to the Quine-McClusky algorithm as the minterms
+def evaluate_and_minimize(_ast, variables):
+    gen_context = GenerateContext(variables)
+    output_column = gen_context.generate_truths(_ast)
+    mcclusky = QM(output_column, variables)
+    mcclusky.generate_solution()
+    return mcclusky.function
+
+
 # Loop expression inputs until the user chooses to quit
 while True:
     print(
@@ -503,13 +662,8 @@ while True:
     else:
         start = time.time()
         print("================================")
-        parser = Parser(expression)
-        ast = parser.parse()
-        genContext = GenerateContext(parser.variables)
-        outputRows = genContext.generate_truths()
-        context = genContext.evaluate_ast_row()
-        mcclusky = QM(context, outputRows, parser.variables)
-        mcclusky.generate_solution()
+        ast, variables = compile_expr(expression)
+        evaluate_and_minimize(ast, list(variables))
         end = time.time()
         print(f"Overall execution time: {end - start}")
         print("================================")